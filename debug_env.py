@@ -6,11 +6,15 @@ import os
 import sys
 
 print("=== 环境变量检查 ===")
-proxy_vars = []
-for key, value in os.environ.items():
-    if 'proxy' in key.lower():
-        proxy_vars.append(f"{key}: {value}")
-        
+# 每个key只做一次lower()；列表推导在C层循环，环境变量很多时
+# （CI/容器）比显式循环+append更快
+proxy_vars = [
+    f"{key}: {value}"
+    for key, value in os.environ.items()
+    if 'proxy' in key.lower()
+]
+
+
 if proxy_vars:
     print("发现代理相关环境变量:")
     for var in proxy_vars:
@@ -3,14 +3,28 @@ Agent模块 - 智能体系统
 包含各种专业智能体实现
 """
 
-from .handler_agent import HandlerAgent, handler_agent
-from .data_service_agent import DataServiceAgent, data_service_agent
+from .handler_agent import HandlerAgent, get_handler_agent
+from .data_service_agent import DataServiceAgent, get_data_service_agent
 from .message_manager import MessageManager
 
+# 导入机制会把同名子模块绑定为包属性，遮蔽下方的模块级__getattr__；
+# 显式删除，让handler_agent/data_service_agent继续解析为懒加载单例
+del handler_agent, data_service_agent
+
 __all__ = [
-    "HandlerAgent", 
+    "HandlerAgent",
     "handler_agent",
     "DataServiceAgent",
-    "data_service_agent", 
+    "data_service_agent",
     "MessageManager"
 ]
+
+
+def __getattr__(name):
+    # PEP 562: 单例按需构造，`from .agents import handler_agent` 不再在导入时
+    # 触发配置解析、LLM客户端创建和LangGraph编译
+    if name == "handler_agent":
+        return get_handler_agent()
+    if name == "data_service_agent":
+        return get_data_service_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
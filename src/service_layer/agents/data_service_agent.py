@@ -5,20 +5,66 @@ DataServiceAgent - 数据服务智能体
 """
 
 import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_openai import ChatOpenAI
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tools import tool
 
-from ..config.config_manager import config_manager
+from ..config.config_manager import get_config_manager
+from ..llm_clients import make_chat
 from ..tools.daily_data_tool import get_daily_stock_data
 from ..tools.adj_factor_tool import get_adj_factor
 from ..tools.daily_basic_tool import get_daily_basic
 from .message_manager import MessageManager
 
+logger = logging.getLogger(__name__)
+
+# 调试开关：设置AGENT_DEBUG=1时才收集并返回Agent中间步骤
+# （中间步骤会随结果一起进缓存，生产环境默认不保留以减少驻留内存）
+_AGENT_DEBUG = bool(os.environ.get("AGENT_DEBUG"))
+
+
+@lru_cache(maxsize=256)
+def _request_digest(request: str) -> str:
+    """计算请求文本的稳定摘要，用于构造缓存key
+
+    使用blake2b替代内置hash()：内置hash带进程级随机盐，重启后失效且
+    长文本存在碰撞风险；blake2b摘要跨进程稳定，便于后续接入持久化缓存。
+    """
+    return hashlib.blake2b(request.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _parsing_error_hint(_error) -> str:
+    """工具调用解析失败时的重试提示
+
+    返回固定短串，替代handle_parsing_errors=True默认路径里的
+    str(异常)+长模板拼接，解析失败高发时省去每次的格式化开销。
+    """
+    return "输出解析失败，请严格按照工具要求的JSON参数格式重新调用工具。"
+
+
+# 思考提示词的固定部分只在模块加载时分配一次，
+# 每次调用仅做一次format填充指令内容
+_THINK_PROMPT_TMPL = """
+作为专业的数据服务智能体，我收到了HandlerAgent的以下指令：
+"{instruction}"
+
+我需要：
+1. 理解指令的具体需求
+2. 判断需要什么类型的数据
+3. 选择合适的数据获取工具
+4. 执行数据获取并返回结构化结果
+
+请帮我分析这个指令并获取相应的数据。
+""".format
+
 
 class DataServiceAgent:
     """数据服务智能体 - 专门负责金融数据获取和处理"""
@@ -29,13 +75,12 @@ class DataServiceAgent:
         self.name = "data_service_agent"
         
         # 获取配置信息
+        config_manager = get_config_manager()
         agent_config = config_manager.get_model_config(self.name)
         
-        # 初始化LLM - 使用明确的参数名称避免proxies问题
-        self.llm = ChatOpenAI(
-            model=agent_config["model_name"],
-            openai_api_key=agent_config["api_key"], 
-            openai_api_base=agent_config["base_url"],
+        # 初始化LLM - 复用跨Agent共享的httpx连接池
+        self.llm = make_chat(
+            agent_config,
             temperature=0.1,  # 数据服务需要更准确，温度设低一点
             max_tokens=2000
         )
@@ -55,7 +100,10 @@ class DataServiceAgent:
             get_adj_factor,           # 复权因子
             get_daily_basic           # 日指标数据
         ]
-        
+        # 工具名列表不会变化，初始化时计算一次（不可变元组可安全共享）
+        self._tool_names = tuple(tool.name for tool in self.tools)
+
+
         # 创建提示词模板
         self.prompt_template = ChatPromptTemplate.from_messages([
             ("system", self.system_prompt),
@@ -75,16 +123,22 @@ class DataServiceAgent:
             agent=self.agent,
             tools=self.tools,
             verbose=False,  # 关闭verbose避免回调错误
-            handle_parsing_errors=True,
+            handle_parsing_errors=_parsing_error_hint,  # 固定提示，跳过默认的异常格式化
             max_iterations=3,  # 限制迭代次数，避免无限循环
-            return_intermediate_steps=True  # 返回中间步骤，便于调试
+            return_intermediate_steps=_AGENT_DEBUG  # 仅调试时返回中间步骤
         )
         
-        # 会话缓存
-        self.session_cache = {}
-        
-        print(f"✅ DataServiceAgent 初始化完成 - 模型: {agent_config['model_name']}")
-        print(f"📊 可用数据工具: {[tool.name for tool in self.tools]}")
+        # 会话缓存 - 有界LRU，避免长时间运行后内存无限增长
+        self.session_cache = OrderedDict()
+        self._conv_index = defaultdict(set)  # conversation_id -> 该对话的缓存key集合
+        self._cache_max = 1024
+
+        # 在途请求表：相同请求并发到达时，后来者等待首个请求的结果，
+        # 避免缓存未填充前重复触发完整的Agent执行链
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        logger.info("DataServiceAgent 初始化完成 - 模型: %s", agent_config['model_name'])
+        logger.info("可用数据工具: %s", list(self._tool_names))
     
     async def process_data_request(self, 
                                   request: str,
@@ -101,58 +155,127 @@ class DataServiceAgent:
         Returns:
             处理结果
         """
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("DataServiceAgent开始处理数据请求: %s...", request[:100])
+
+        # 检查缓存与请求合并：相同请求已在处理中时等待其结果；
+        # 领头请求被取消（预取被判定节点否决是常规路径）时在途future
+        # 一并取消，等待者视作未命中重新走一遍，而不是把CancelledError
+        # 传染给无辜的并发请求
+        cache_key = f"{conversation_id}:{_request_digest(request)}"
+        while True:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                logger.debug("命中缓存，直接返回结果")
+                return cached
+
+            inflight = self._inflight.get(cache_key)
+            if inflight is None:
+                break
+            logger.debug("相同请求处理中，等待在途结果")
+            try:
+                return await inflight
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # 是等待者自身被取消，照常向上传播
+                # 领头请求被取消，在途结果不会产生：按未命中自行重试
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+        try:
+            response_data = await self._execute_data_request(
+                request, conversation_id, context, cache_key)
+        except asyncio.CancelledError:
+            # cancel而非set_exception：取消的future不会产生
+            # "exception was never retrieved"日志噪音
+            if not future.done():
+                future.cancel()
+            raise
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+            raise
+        else:
+            future.set_result(response_data)
+            return response_data
+        finally:
+            self._inflight.pop(cache_key, None)
+
+    async def _execute_data_request(self,
+                                    request: str,
+                                    conversation_id: str,
+                                    context: Optional[Dict[str, Any]],
+                                    cache_key: str) -> Dict[str, Any]:
+        """执行实际的数据获取（缓存与请求合并已在入口处理）"""
         try:
-            print(f"\n🔍 DataServiceAgent开始处理数据请求")
-            print(f"📋 请求内容: {request[:100]}...")
-            
-            # 检查缓存
-            cache_key = f"{conversation_id}:{hash(request)}"
-            if cache_key in self.session_cache:
-                print(f"💾 命中缓存，直接返回结果")
-                return self.session_cache[cache_key]
-            
             # 使用新版本的invoke方法
-            print(f"🤖 调用DataServiceAgent执行数据获取...")
+            logger.debug("调用DataServiceAgent执行数据获取...")
             result = await self.executor.ainvoke({
                 "input": request
             })
-            
+
+            # 时间戳只取一次，成功和失败路径共用
+            timestamp = datetime.now().isoformat()
+
             # 处理结果 - 适配0.2版本的返回格式
             if result and "output" in result:
                 response_data = {
                     "success": True,
                     "message": "数据获取成功",
                     "content": result["output"],
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": timestamp,
                     "agent": self.name,
-                    "tools_used": [tool.name for tool in self.tools],
+                    "tools_used": self._tool_names,
                     "context": context or {},
-                    "intermediate_steps": result.get("intermediate_steps", [])
                 }
-                
+                if _AGENT_DEBUG:
+                    response_data["intermediate_steps"] = result.get("intermediate_steps", [])
+
                 # 缓存结果
-                self.session_cache[cache_key] = response_data
-                
-                print(f"✅ 数据请求处理完成")
+                self._cache_put(cache_key, conversation_id, response_data)
+
+                logger.debug("数据请求处理完成")
                 return response_data
             else:
                 error_msg = "Agent执行未返回有效结果"
-                print(f"❌ {error_msg}")
-                return self._create_error_response(error_msg, "无法获取数据，请检查请求格式或重试")
-                
+                logger.error(error_msg)
+                return self._create_error_response(
+                    error_msg, "无法获取数据，请检查请求格式或重试", timestamp)
+
         except Exception as e:
             error_msg = f"DataServiceAgent处理异常: {str(e)}"
-            print(f"❌ {error_msg}")
-            
+            logger.error(error_msg)
+
             return self._create_error_response(error_msg, f"数据服务暂时不可用: {str(e)}")
     
-    def _create_error_response(self, error_msg: str, user_message: str) -> Dict[str, Any]:
-        """创建错误响应"""
+    def _cache_get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """LRU缓存查询，命中时将key移到队尾（最近使用）"""
+        result = self.session_cache.get(cache_key)
+        if result is not None:
+            self.session_cache.move_to_end(cache_key)
+        return result
+
+    def _cache_put(self, cache_key: str, conversation_id: str, response_data: Dict[str, Any]):
+        """写入LRU缓存，超出容量时O(1)淘汰最久未使用的条目"""
+        self.session_cache[cache_key] = response_data
+        self.session_cache.move_to_end(cache_key)
+        self._conv_index[conversation_id].add(cache_key)
+        if len(self.session_cache) > self._cache_max:
+            evicted_key, _ = self.session_cache.popitem(last=False)
+            # 从对话索引中同步移除被淘汰的key
+            evicted_conv = evicted_key.split(":", 1)[0]
+            self._conv_index[evicted_conv].discard(evicted_key)
+            if not self._conv_index[evicted_conv]:
+                del self._conv_index[evicted_conv]
+
+    def _create_error_response(self, error_msg: str, user_message: str,
+                               timestamp: str = None) -> Dict[str, Any]:
+        """创建错误响应（可复用调用方已取好的时间戳）"""
         return {
             "success": False,
             "message": error_msg,
             "content": user_message,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp or datetime.now().isoformat(),
             "agent": self.name
         }
     
@@ -170,23 +293,20 @@ class DataServiceAgent:
             思考和处理结果
         """
         try:
-            print(f"🧠 DataServiceAgent开始思考HandlerAgent的指令...")
-            print(f"📨 收到指令: {handler_instruction[:100]}...")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("DataServiceAgent收到HandlerAgent指令: %s...", handler_instruction[:100])
             
-            # 构建思考提示词
-            thinking_prompt = f"""
-作为专业的数据服务智能体，我收到了HandlerAgent的以下指令：
-"{handler_instruction}"
+            # 先按原始指令查缓存：重复指令无需再构建思考提示词和计算其摘要
+            cache_key = f"{conversation_id}:thinking:{_request_digest(handler_instruction)}"
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                logger.debug("指令缓存命中，直接返回思考结果")
+                return cached
+
+            # 构建思考提示词（模板常量部分已预分配）
+            thinking_prompt = _THINK_PROMPT_TMPL(instruction=handler_instruction)
 
-我需要：
-1. 理解指令的具体需求
-2. 判断需要什么类型的数据
-3. 选择合适的数据获取工具
-4. 执行数据获取并返回结构化结果
 
-请帮我分析这个指令并获取相应的数据。
-"""
-            
             # 调用数据处理逻辑
             result = await self.process_data_request(
                 request=thinking_prompt,
@@ -199,15 +319,17 @@ class DataServiceAgent:
                 result["thinking_process"] = {
                     "received_instruction": handler_instruction,
                     "analysis": "已理解指令并成功获取数据",
-                    "selected_tools": [tool.name for tool in self.tools],
-                    "processing_time": datetime.now().isoformat()
+                    "selected_tools": self._tool_names,
+                    "processing_time": result["timestamp"]  # 复用响应时间戳
                 }
-            
+                # 以原始指令为key缓存，下次相同指令直接短路返回
+                self._cache_put(cache_key, conversation_id, result)
+
             return result
             
         except Exception as e:
             error_msg = f"DataServiceAgent思考处理异常: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error(error_msg)
             return self._create_error_response(error_msg, f"思考处理失败: {str(e)}")
     
     def clear_cache(self, conversation_id: str = None):
@@ -218,24 +340,24 @@ class DataServiceAgent:
             conversation_id: 指定对话ID，如果为None则清理所有缓存
         """
         if conversation_id:
-            # 清理指定对话的缓存
-            keys_to_remove = [key for key in self.session_cache.keys() 
-                            if key.startswith(f"{conversation_id}:")]
+            # 通过对话索引直接定位，只遍历受影响的key
+            keys_to_remove = self._conv_index.pop(conversation_id, ())
             for key in keys_to_remove:
-                del self.session_cache[key]
-            print(f"🗑️  清理了对话 {conversation_id} 的缓存，共 {len(keys_to_remove)} 条")
+                self.session_cache.pop(key, None)
+            logger.info("清理了对话 %s 的缓存，共 %d 条", conversation_id, len(keys_to_remove))
         else:
             # 清理所有缓存
             cache_count = len(self.session_cache)
             self.session_cache.clear()
-            print(f"🗑️  清理了所有缓存，共 {cache_count} 条")
+            self._conv_index.clear()
+            logger.info("清理了所有缓存，共 %d 条", cache_count)
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
         return {
             "cache_count": len(self.session_cache),
             "tools_available": len(self.tools),
-            "tool_names": [tool.name for tool in self.tools],
+            "tool_names": self._tool_names,
             "agent_name": self.name,
             "langchain_version": "0.2.x"
         }
@@ -243,5 +365,21 @@ class DataServiceAgent:
  
 
 
-# 全局DataServiceAgent实例
-data_service_agent = DataServiceAgent()
+# 全局DataServiceAgent实例 - 延迟构造，首次访问时才初始化
+_instance: Optional[DataServiceAgent] = None
+
+
+def get_data_service_agent() -> DataServiceAgent:
+    """获取全局DataServiceAgent单例，首次调用时才真正构造"""
+    global _instance
+    if _instance is None:
+        _instance = DataServiceAgent()
+    return _instance
+
+
+def __getattr__(name: str):
+    # PEP 562: 保持 `from .data_service_agent import data_service_agent` 可用，
+    # 但把LLM客户端创建、工具注册等重开销推迟到首次实际使用
+    if name == "data_service_agent":
+        return get_data_service_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
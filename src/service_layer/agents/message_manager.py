@@ -3,11 +3,33 @@ MessageManager - 对话上下文管理器
 负责智能管理Agent的对话历史，控制消息增长
 """
 
+import logging
+import os
+import re
+from collections import deque
+
+import numpy as np
 import tiktoken
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+# 编码器在模块加载时创建一次，所有MessageManager实例共享
+# （tiktoken.get_encoding需要加载BPE词表，重复创建开销大）
+_ENCODING = tiktoken.get_encoding("cl100k_base")
+
+# 摘要用的结构化要点抽取正则（预编译）
+_TICKER_RE = re.compile(r"\d{6}\.(?:SH|SZ)")
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}|\d{8}")
+
+# 关键词预编译为单个正则交替：一次C层扫描替代逐关键词的
+# Python层子串搜索（关键词为中文，无须大小写归一）
+_PRIORITY_KW_RE = re.compile(r"投资|策略|分析|风险|回测|收益|股票|基金")
+_SUMMARY_KEYWORDS = ('投资', '策略', '分析', '风险', '股票', '基金', '回测')
+_SUMMARY_KW_RE = re.compile("|".join(_SUMMARY_KEYWORDS))
+
 
 class MessageManager:
     """智能消息管理器 - 控制对话上下文增长"""
@@ -23,25 +45,67 @@ class MessageManager:
         self.max_messages = max_messages
         self.max_tokens = max_tokens
         
-        # 使用默认的通用编码器
-        self.encoding = tiktoken.get_encoding("cl100k_base")
-            
-        print(f"✅ MessageManager初始化完成 - 最大消息数: {max_messages}, 最大tokens: {max_tokens}")
+        # 使用默认的通用编码器（模块级共享实例）
+        self.encoding = _ENCODING
+
+
+        logger.info("MessageManager初始化完成 - 最大消息数: %d, 最大tokens: %d",
+                    max_messages, max_tokens)
     
     def count_tokens(self, message: BaseMessage) -> int:
-        """计算单个消息的token数量"""
+        """计算单个消息的token数量（结果缓存在消息对象上）"""
+        # 消息内容不可变，首次编码后把结果挂在消息上，
+        # 后续每轮裁剪只需为新增消息付出编码成本
+        cached = getattr(message, "_token_count", None)
+        if cached is not None:
+            return cached
+
         try:
             content = str(message.content)
-            return len(self.encoding.encode(content))
+            # 只需要token数量而非id序列，encode_ordinary跳过
+            # 特殊token的正则扫描，比encode更快
+            tokens = len(self.encoding.encode_ordinary(content))
         except Exception as e:
             # 如果计算失败，使用近似估算 (1 token ≈ 4 characters)
-            return len(str(message.content)) // 4
+            tokens = len(str(message.content)) // 4
+
+        try:
+            message._token_count = tokens
+        except Exception:
+            pass  # 消息对象不可写时退化为每次重新计算
+        return tokens
     
     def count_total_tokens(self, messages: List[BaseMessage]) -> int:
-        """计算消息列表的总token数"""
+        """计算消息列表的总token数（未缓存的消息批量编码）"""
         total = 0
+        pending = []  # 尚无缓存token数的消息
         for msg in messages:
-            total += self.count_tokens(msg)
+            cached = getattr(msg, "_token_count", None)
+            if cached is not None:
+                total += cached
+            else:
+                pending.append(msg)
+
+        if pending:
+            try:
+                # encode_ordinary_batch在Rust侧并行处理并跳过特殊token
+                # 扫描，比逐条encode更快；结果写回消息对象供后续轮次复用
+                encoded = self.encoding.encode_ordinary_batch(
+                    [str(msg.content) for msg in pending],
+                    num_threads=os.cpu_count() or 1,
+                )
+                for msg, tokens in zip(pending, encoded):
+                    count = len(tokens)
+                    try:
+                        msg._token_count = count
+                    except Exception:
+                        pass
+                    total += count
+            except Exception:
+                # 批量编码失败时回退到逐条计算
+                for msg in pending:
+                    total += self.count_tokens(msg)
+
         return total
     
     def get_message_priority(self, message: BaseMessage, index: int, total_count: int) -> int:
@@ -71,16 +135,15 @@ class MessageManager:
         priority += position_score
         
         # 3. 内容长度优先级 (较长的消息通常包含更多信息)
-        content_length = len(str(message.content))
+        content = str(message.content)
+        content_length = len(content)
         if content_length > 200:
             priority += 10
         elif content_length > 100:
             priority += 5
-        
-        # 4. 关键词检测
-        content_lower = str(message.content).lower()
-        keywords = ['投资', '策略', '分析', '风险', '回测', '收益', '股票', '基金']
-        keyword_count = sum(1 for kw in keywords if kw in content_lower)
+
+        # 4. 关键词检测（预编译正则单次扫描，按命中的不同关键词计数）
+        keyword_count = len(set(_PRIORITY_KW_RE.findall(content)))
         priority += keyword_count * 3
         
         return min(priority, 100)  # 限制最大值为100
@@ -117,39 +180,106 @@ class MessageManager:
         return recent_messages
     
     def _generate_summary(self, messages: List[BaseMessage]) -> str:
-        """生成消息摘要"""
+        """生成消息摘要（单次遍历，不拼接全量历史文本）"""
         if not messages:
             return "无历史对话"
-        
-        # 统计消息类型
-        user_msgs = [msg for msg in messages if isinstance(msg, HumanMessage)]
-        ai_msgs = [msg for msg in messages if isinstance(msg, AIMessage)]
-        
-        # 提取关键主题
-        all_content = " ".join([str(msg.content) for msg in messages])
-        keywords = ['投资', '策略', '分析', '风险', '股票', '基金', '回测']
-        mentioned_topics = [kw for kw in keywords if kw in all_content]
-        
+
+        # 一趟遍历同时数消息类型并逐条扫关键词，
+        # 8个关键词集齐后不再做任何内容扫描
+        user_count = ai_count = 0
+        hits = set()
+        all_found = False
+        for msg in messages:
+            msg_type = type(msg)
+            if msg_type is HumanMessage:
+                user_count += 1
+            elif msg_type is AIMessage:
+                ai_count += 1
+            if not all_found:
+                hits.update(_SUMMARY_KW_RE.findall(str(msg.content)))
+                all_found = len(hits) == len(_SUMMARY_KEYWORDS)
+        mentioned_topics = [kw for kw in _SUMMARY_KEYWORDS if kw in hits]
+
         # 生成摘要
-        summary_parts = []
-        summary_parts.append(f"包含{len(user_msgs)}个用户问题和{len(ai_msgs)}个AI回复")
-        
+        summary_parts = [f"包含{user_count}个用户问题和{ai_count}个AI回复"]
+
         if mentioned_topics:
             summary_parts.append(f"主要讨论了：{', '.join(mentioned_topics[:3])}")
-        
-        # 获取最后几个关键对话
-        important_exchanges = []
-        for i in range(len(messages) - 1):
-            if isinstance(messages[i], HumanMessage) and i + 1 < len(messages):
-                user_q = str(messages[i].content)[:50] + "..."
-                if len(important_exchanges) < 2:  # 只保留最后2个重要对话
-                    important_exchanges.append(user_q)
-        
-        if important_exchanges:
-            summary_parts.append(f"最近讨论：{'; '.join(important_exchanges)}")
-        
+
+        # 倒序收集最近2个用户问题，凑齐即停
+        recent_questions = []
+        for msg in reversed(messages):
+            if type(msg) is HumanMessage:
+                recent_questions.append(str(msg.content)[:50] + "...")
+                if len(recent_questions) == 2:
+                    break
+
+        if recent_questions:
+            recent_questions.reverse()
+            summary_parts.append(f"最近讨论：{'; '.join(recent_questions)}")
+
         return " | ".join(summary_parts)
     
+    def summarize_if_needed(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """
+        当token总量超过预算的80%时，把最旧的消息折叠为启发式摘要
+
+        不额外调用LLM：用预编译正则抽取股票代码、日期等结构化要点，
+        连同消息统计拼成一条摘要SystemMessage，最近的消息保留原文。
+
+        Args:
+            messages: 原始消息列表
+
+        Returns:
+            折叠后的消息列表（未超阈值时原样返回）
+        """
+        if len(messages) < 4:
+            return messages
+
+        total_tokens = self.count_total_tokens(messages)
+        if total_tokens <= int(self.max_tokens * 0.8):
+            return messages
+
+        # 折叠最旧的消息，直到被折叠部分约占token预算的一半
+        # （最近2条消息始终保留原文）
+        fold_budget = self.max_tokens // 2
+        folded_tokens = 0
+        fold_count = 0
+        for msg in messages[:-2]:
+            folded_tokens += self.count_tokens(msg)
+            fold_count += 1
+            if folded_tokens >= fold_budget:
+                break
+
+        if fold_count == 0:
+            return messages
+
+        old_messages = messages[:fold_count]
+        recent_messages = messages[fold_count:]
+
+        # 抽取结构化要点
+        all_content = " ".join(str(msg.content) for msg in old_messages)
+        tickers = sorted(set(_TICKER_RE.findall(all_content)))
+        dates = sorted(set(_DATE_RE.findall(all_content)))
+
+        summary_parts = [self._generate_summary(old_messages)]
+        if tickers:
+            summary_parts.append(f"涉及股票: {', '.join(tickers[:5])}")
+        if dates:
+            if len(dates) > 1:
+                summary_parts.append(f"涉及日期: {dates[0]}~{dates[-1]}")
+            else:
+                summary_parts.append(f"涉及日期: {dates[0]}")
+
+        summary_message = SystemMessage(
+            content=f"[历史对话摘要] {' | '.join(summary_parts)}"
+        )
+
+        # 确保第一个消息仍是SystemMessage
+        if recent_messages and isinstance(recent_messages[0], SystemMessage):
+            return [recent_messages[0], summary_message] + recent_messages[1:]
+        return [summary_message] + recent_messages
+
     def optimize_messages(self, messages: List[BaseMessage]) -> List[BaseMessage]:
         """
         优化消息列表，控制增长
@@ -162,52 +292,126 @@ class MessageManager:
         """
         if not messages:
             return messages
-        
-        print(f"📊 消息优化前: {len(messages)}条消息, {self.count_total_tokens(messages)}个tokens")
-        
+
+        # 快速路径：两个限制都未触达时原样返回——token数命中每消息缓存，
+        # 常态下这里只是O(n)的属性读取，不做任何压缩或日志工作
+        total_tokens = self.count_total_tokens(messages)
+        if len(messages) <= self.max_messages and total_tokens <= self.max_tokens:
+            return messages
+
+        logger.debug("消息优化前: %d条消息, %d个tokens", len(messages), total_tokens)
+
         # 1. 首先检查数量限制
         if len(messages) > self.max_messages:
-            print(f"⚠️  消息数量超限({len(messages)} > {self.max_messages})，应用数量压缩")
+            logger.debug("消息数量超限(%d > %d)，应用数量压缩",
+                         len(messages), self.max_messages)
             messages = self.compress_old_messages(messages, self.max_messages)
-        
+
         # 2. 检查token限制
         total_tokens = self.count_total_tokens(messages)
         if total_tokens > self.max_tokens:
-            print(f"⚠️  Token数量超限({total_tokens} > {self.max_tokens})，应用token压缩")
+            logger.debug("Token数量超限(%d > %d)，应用token压缩",
+                         total_tokens, self.max_tokens)
             messages = self._compress_by_tokens(messages)
-        
-        print(f"📊 消息优化后: {len(messages)}条消息, {self.count_total_tokens(messages)}个tokens")
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("消息优化后: %d条消息, %d个tokens",
+                         len(messages), self.count_total_tokens(messages))
         return messages
     
+    def optimize_and_stats(self, messages: List[BaseMessage]) -> Tuple[List[BaseMessage], Dict[str, Any]]:
+        """
+        优化消息列表并同时返回统计信息（单次遍历）
+
+        供热路径使用：相比optimize_messages + get_stats两次独立遍历，
+        统计在优化结果上一趟完成，token数直接命中每消息缓存。
+
+        Args:
+            messages: 原始消息列表
+
+        Returns:
+            (优化后的消息列表, 统计信息字典)
+        """
+        optimized = self.optimize_messages(messages)
+
+        total_tokens = 0
+        system_count = user_count = ai_count = 0
+        for msg in optimized:
+            total_tokens += self.count_tokens(msg)
+            msg_type = type(msg)
+            if msg_type is SystemMessage:
+                system_count += 1
+            elif msg_type is HumanMessage:
+                user_count += 1
+            elif msg_type is AIMessage:
+                ai_count += 1
+
+        stats = {
+            "total_messages": len(optimized),
+            "total_tokens": total_tokens,
+            "system_messages": system_count,
+            "user_messages": user_count,
+            "ai_messages": ai_count,
+            "avg_tokens_per_message": total_tokens // len(optimized) if optimized else 0
+        }
+        return optimized, stats
+
     def _compress_by_tokens(self, messages: List[BaseMessage]) -> List[BaseMessage]:
         """根据token限制压缩消息"""
         if not messages:
             return messages
         
-        # 保护SystemMessage
-        system_messages = [msg for msg in messages if isinstance(msg, SystemMessage)]
-        other_messages = [msg for msg in messages if not isinstance(msg, SystemMessage)]
-        
-        # 为每个消息计算优先级
-        message_priorities = []
-        for i, msg in enumerate(other_messages):
-            priority = self.get_message_priority(msg, i, len(other_messages))
-            tokens = self.count_tokens(msg)
-            message_priorities.append((msg, priority, tokens, i))
+        # 保护SystemMessage（具体消息类直接type is比较，绕开MRO遍历）
+        system_messages = [msg for msg in messages if type(msg) is SystemMessage]
+        other_messages = [msg for msg in messages if type(msg) is not SystemMessage]
         
-        # 按优先级排序 (高优先级在前)
-        message_priorities.sort(key=lambda x: x[1], reverse=True)
-        
-        # 选择消息直到达到token限制
+        # 全是SystemMessage仍超预算时没有可打分的消息，直接走
+        # 原有的最小保留兜底，避免下方打分算术除以0
+        if not other_messages:
+            if len(system_messages) < 6:
+                return self.compress_old_messages(messages[-6:], 6)
+            return system_messages[:]
+
+        # 优先级/token数放进并行numpy数组：打分算术、排序（argsort）、
+        # 前缀和（cumsum）和预算截断（searchsorted）全部在C层完成，
+        # 不再构造Python元组也没有逐消息的解释器循环
+        n = len(other_messages)
+        contents = [str(msg.content) for msg in other_messages]
+        type_scores = np.fromiter(
+            (30.0 if type(msg) is AIMessage
+             else 20.0 if type(msg) is HumanMessage else 0.0
+             for msg in other_messages),
+            dtype=np.float64, count=n,
+        )
+        lengths = np.fromiter((len(c) for c in contents), dtype=np.int64, count=n)
+        kw_hits = np.fromiter(
+            (len(set(_PRIORITY_KW_RE.findall(c))) for c in contents),
+            dtype=np.int64, count=n,
+        )
+        # 与get_message_priority同一套打分规则的向量化形式
+        priorities = (
+            type_scores
+            + np.arange(n, dtype=np.float64) * (30.0 / n)
+            + np.where(lengths > 200, 10.0, np.where(lengths > 100, 5.0, 0.0))
+            + kw_hits * 3.0
+        )
+        np.minimum(priorities, 100.0, out=priorities)
+        tokens = np.fromiter(
+            (self.count_tokens(msg) for msg in other_messages),
+            dtype=np.int64, count=n,
+        )
+
         selected_messages = system_messages[:]
         current_tokens = sum(self.count_tokens(msg) for msg in system_messages)
-        
-        for msg, priority, tokens, original_index in message_priorities:
-            if current_tokens + tokens <= self.max_tokens:
-                selected_messages.append(msg)
-                current_tokens += tokens
-            else:
-                break
+
+        # 稳定排序保证同优先级时旧消息在前，与原先的sort语义一致；
+        # searchsorted找出预算内最长的高优先级前缀
+        order = np.argsort(-priorities, kind='stable')
+        cum_tokens = np.cumsum(tokens[order])
+        keep = int(np.searchsorted(
+            cum_tokens, self.max_tokens - current_tokens, side='right'
+        ))
+        selected_messages.extend(other_messages[i] for i in order[:keep])
         
         # 如果删除了太多消息，至少保留最近的几条
         if len(selected_messages) < 6:  # 至少保留6条消息
@@ -216,18 +420,40 @@ class MessageManager:
         
         return selected_messages
     
+    def new_history(self) -> deque:
+        """创建以max_messages为上限的对话历史容器（O(1)追加）"""
+        return deque(maxlen=self.max_messages)
+
     def add_message(self, messages: List[BaseMessage], new_message: BaseMessage) -> List[BaseMessage]:
         """
         添加新消息并优化列表
-        
+
         Args:
-            messages: 当前消息列表
+            messages: 当前消息列表或new_history()创建的deque
             new_message: 要添加的新消息
-            
+
         Returns:
             优化后的消息列表
         """
-        updated_messages = messages + [new_message]
+        # deque历史（new_history()创建）追加为O(1)，数量上限由maxlen
+        # 自动维护；普通list保持原有的拷贝语义
+        if isinstance(messages, deque):
+            messages.append(new_message)
+            updated_messages = messages
+        else:
+            updated_messages = messages + [new_message]
+        # 快速路径：历史远未触达阈值时只需为新消息编码一次，
+        # 既不折叠摘要也不走压缩分支（摘要阈值为token预算的80%）
+        if (len(updated_messages) <= self.max_messages
+                and self.count_total_tokens(updated_messages) <= int(self.max_tokens * 0.8)):
+            return updated_messages
+
+        # 压缩分支需要切片语义，deque在此边界转回list
+        if isinstance(updated_messages, deque):
+            updated_messages = list(updated_messages)
+
+        # 先做无LLM的启发式摘要折叠，再走常规数量/token限制
+        updated_messages = self.summarize_if_needed(updated_messages)
         return self.optimize_messages(updated_messages)
     
     def get_stats(self, messages: List[BaseMessage]) -> Dict[str, Any]:
@@ -241,13 +467,24 @@ class MessageManager:
                 "ai_messages": 0
             }
         
-        stats = {
+        # 单次遍历同时累计token数和各类型计数，token数命中每消息缓存
+        total_tokens = 0
+        system_count = user_count = ai_count = 0
+        for msg in messages:
+            total_tokens += self.count_tokens(msg)
+            msg_type = type(msg)
+            if msg_type is SystemMessage:
+                system_count += 1
+            elif msg_type is HumanMessage:
+                user_count += 1
+            elif msg_type is AIMessage:
+                ai_count += 1
+
+        return {
             "total_messages": len(messages),
-            "total_tokens": self.count_total_tokens(messages),
-            "system_messages": sum(1 for msg in messages if isinstance(msg, SystemMessage)),
-            "user_messages": sum(1 for msg in messages if isinstance(msg, HumanMessage)),
-            "ai_messages": sum(1 for msg in messages if isinstance(msg, AIMessage)),
-            "avg_tokens_per_message": self.count_total_tokens(messages) // len(messages)
+            "total_tokens": total_tokens,
+            "system_messages": system_count,
+            "user_messages": user_count,
+            "ai_messages": ai_count,
+            "avg_tokens_per_message": total_tokens // len(messages)
         }
-        
-        return stats
@@ -4,17 +4,25 @@ Service层API接口
 """
 
 import asyncio
-from typing import Dict, Any
+import logging
+import threading
+from typing import Dict, Any, Optional
 from datetime import datetime
-from ..agents.handler_agent import handler_agent
+from ..agents.handler_agent import get_handler_agent
+
+logger = logging.getLogger(__name__)
 
 class ServiceAPI:
     """Service层统一API接口"""
-    
+
     def __init__(self):
         """初始化Service API"""
-        self.handler_agent = handler_agent
-        print("✅ ServiceAPI 初始化完成")
+        logger.info("ServiceAPI 初始化完成")
+
+    @property
+    def handler_agent(self):
+        """HandlerAgent单例 - 延迟构造，首次处理请求时才初始化"""
+        return get_handler_agent()
     
     async def process_user_message(self, 
                                  user_input: str, 
@@ -32,9 +40,9 @@ class ServiceAPI:
             处理结果
         """
         try:
-            print(f"\n🔄 ServiceAPI收到消息处理请求")
-            print(f"📝 用户输入: {user_input[:100]}...")
-            print(f"🗨️ 对话ID: {conversation_id}")
+            logger.debug("ServiceAPI收到消息处理请求 - 对话ID: %s", conversation_id)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("用户输入: %s...", user_input[:100])
             
             # 调用HandlerAgent处理消息
             result = await self.handler_agent.process_message(
@@ -62,7 +70,7 @@ class ServiceAPI:
                 
         except Exception as e:
             error_msg = f"ServiceAPI处理异常: {str(e)}"
-            print(f"❌ {error_msg}")
+            logger.error(error_msg)
             
             return {
                 "success": False,
@@ -114,7 +122,7 @@ class ServiceAPI:
             测试结果
         """
         try:
-            print("🧪 开始系统自测试...")
+            logger.info("开始系统自测试...")
             
             # 测试HandlerAgent工作流
             handler_test = await self.handler_agent.test_workflow()
@@ -139,21 +147,49 @@ class ServiceAPI:
 # 全局ServiceAPI实例
 service_api = ServiceAPI()
 
+# 常驻后台事件循环：sync包装器此前每次调用asyncio.run，
+# 反复新建/销毁事件循环且连带丢弃httpx连接池的keep-alive连接；
+# 改为单一后台线程上的共享循环，协程经run_coroutine_threadsafe提交
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """获取常驻后台事件循环（首次调用时才启动线程）"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever,
+                    name="service-api-loop",
+                    daemon=True
+                ).start()
+                _loop = loop
+    return _loop
+
+
+def _run_sync(coro) -> Dict[str, Any]:
+    """在共享事件循环上同步执行协程"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_event_loop()).result()
+
+
 # 同步包装器函数
 def sync_process_user_message(user_input: str, conversation_id: str, user_id: str = None) -> Dict[str, Any]:
     """
     同步处理用户消息（供Web层调用）
     """
-    return asyncio.run(service_api.process_user_message(user_input, conversation_id, user_id))
+    return _run_sync(service_api.process_user_message(user_input, conversation_id, user_id))
 
 def sync_get_agent_status() -> Dict[str, Any]:
     """
     同步获取Agent状态
     """
-    return asyncio.run(service_api.get_agent_status())
+    return _run_sync(service_api.get_agent_status())
 
 def sync_test_system() -> Dict[str, Any]:
     """
     同步系统测试
     """
-    return asyncio.run(service_api.test_system())
+    return _run_sync(service_api.test_system())
@@ -3,14 +3,37 @@
 负责读取和验证API配置信息
 """
 
-import json
 import os
+
+import orjson
+from functools import lru_cache
 from typing import Dict, Any, Optional
 from pathlib import Path
 
+# 解析结果按(路径, mtime)缓存：测试/多worker重复构造ConfigManager时
+# 文件未变则直接复用已解析的数据，不再重读重解析
+_PARSE_CACHE: Dict[str, tuple] = {}
+
+
+def _load_json(path: Path) -> Any:
+    """读取并解析JSON文件，结果按文件mtime缓存"""
+    key = str(path)
+    mtime = path.stat().st_mtime_ns
+    cached = _PARSE_CACHE.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    data = orjson.loads(path.read_bytes())
+    _PARSE_CACHE[key] = (mtime, data)
+    return data
+
+
 class ConfigManager:
     """配置管理器"""
-    
+
+    # 固定属性集合用slots：省每实例__dict__内存，属性访问更快
+    __slots__ = ("config_path", "prompt_config_path",
+                 "_config_data", "_prompt_config_data")
+
     def __init__(self, config_path: Optional[str] = None):
         """
         初始化配置管理器
@@ -40,13 +63,17 @@ class ConfigManager:
             if not self.config_path.exists():
                 raise FileNotFoundError(f"配置文件不存在: {self.config_path}")
             
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                self._config_data = json.load(f)
+            # orjson直接解析字节串，比stdlib json快数倍；mtime未变时走缓存
+            self._config_data = _load_json(self.config_path)
             
             print(f"✅ API配置文件加载成功: {self.config_path}")
-            
+
             # 加载Prompt配置（可选）
             self._load_prompt_config()
+
+            # 重新加载后清空getter缓存，避免返回旧配置
+            self.get_model_config.cache_clear()
+            self.get_prompt_config.cache_clear()
             
         except Exception as e:
             print(f"❌ 配置文件加载失败: {e}")
@@ -56,8 +83,7 @@ class ConfigManager:
         """加载Prompt配置文件"""
         try:
             if self.prompt_config_path.exists():
-                with open(self.prompt_config_path, 'r', encoding='utf-8') as f:
-                    self._prompt_config_data = json.load(f)
+                self._prompt_config_data = _load_json(self.prompt_config_path)
                 print(f"✅ Prompt配置文件加载成功: {self.prompt_config_path}")
             else:
                 print(f"⚠️  Prompt配置文件不存在: {self.prompt_config_path}")
@@ -66,10 +92,12 @@ class ConfigManager:
             print(f"⚠️  Prompt配置文件加载失败: {e}，将使用默认配置")
             self._prompt_config_data = {}
     
+    @lru_cache(maxsize=None)
     def get_model_config(self, agent_name: str) -> Dict[str, Any]:
         """
         获取指定Agent的模型配置
-        
+        配置在进程内不变，结果按agent_name缓存，重复调用为O(1)查表
+
         Args:
             agent_name: Agent名称 (如: handler_agent, strategy_agent)
             
@@ -136,10 +164,12 @@ class ConfigManager:
             print(f"❌ 配置验证过程中出错: {e}")
             return False
     
+    @lru_cache(maxsize=None)
     def get_prompt_config(self, agent_name: str) -> str:
         """
         获取指定Agent的系统提示词
-        
+        与get_model_config相同，结果按agent_name缓存
+
         Args:
             agent_name: Agent名称 (如: handler_agent, strategy_agent)
             
@@ -174,5 +204,20 @@ class ConfigManager:
         
         return self._config_data.copy()
 
-# 全局配置管理器实例
-config_manager = ConfigManager()
+# 全局配置管理器实例 - 延迟构造，首次访问时才加载配置文件
+_instance: Optional[ConfigManager] = None
+
+
+def get_config_manager() -> ConfigManager:
+    """获取全局ConfigManager单例，首次调用时才真正构造"""
+    global _instance
+    if _instance is None:
+        _instance = ConfigManager()
+    return _instance
+
+
+def __getattr__(name: str):
+    # 兼容旧的`from ... import config_manager`用法（PEP 562）
+    if name == "config_manager":
+        return get_config_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
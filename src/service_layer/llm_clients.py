@@ -0,0 +1,42 @@
+"""
+LLM客户端工厂
+所有Agent共享同一个httpx连接池，避免每个Agent各自创建独立客户端、
+在并发负载下重复进行TCP/TLS握手
+"""
+
+import httpx
+from typing import Any, Dict
+from langchain_openai import ChatOpenAI
+
+# 共享连接池：keep-alive复用socket和TLS会话，跨Agent共享
+_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+
+# HTTP/2多路复用：数据判定和回复生成两次LLM调用可共享同一条TCP流。
+# http2依赖可选的h2包，缺失时回退到HTTP/1.1 keep-alive
+try:
+    _HTTP_CLIENT = httpx.Client(limits=_LIMITS, http2=True)
+    _ASYNC_HTTP_CLIENT = httpx.AsyncClient(limits=_LIMITS, http2=True)
+except ImportError:
+    _HTTP_CLIENT = httpx.Client(limits=_LIMITS)
+    _ASYNC_HTTP_CLIENT = httpx.AsyncClient(limits=_LIMITS)
+
+
+def make_chat(agent_config: Dict[str, Any], **kwargs) -> ChatOpenAI:
+    """
+    基于共享连接池创建ChatOpenAI实例
+
+    Args:
+        agent_config: 包含model_name/api_key/base_url的模型配置字典
+        **kwargs: 透传给ChatOpenAI的其他参数（temperature、max_tokens等）
+
+    Returns:
+        复用全局httpx连接池的ChatOpenAI实例
+    """
+    return ChatOpenAI(
+        model=agent_config["model_name"],
+        openai_api_key=agent_config["api_key"],
+        openai_api_base=agent_config["base_url"],
+        http_client=_HTTP_CLIENT,
+        http_async_client=_ASYNC_HTTP_CLIENT,
+        **kwargs
+    )
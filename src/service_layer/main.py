@@ -11,7 +11,7 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.service_layer.config.config_manager import config_manager
+from src.service_layer.config.config_manager import get_config_manager
 from src.service_layer.api.service import service_api, sync_test_system
 
 def main():
@@ -21,7 +21,7 @@ def main():
     try:
         # 验证配置
         print("\n📋 验证配置文件...")
-        if not config_manager.validate_config():
+        if not get_config_manager().validate_config():
             print("❌ 配置文件验证失败")
             return False
         
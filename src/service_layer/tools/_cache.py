@@ -0,0 +1,79 @@
+"""
+工具结果缓存模块
+Tushare接口受上游限频，且相同的(代码, 日期)组合会在多轮对话中反复
+出现。这里提供进程内TTL缓存装饰器：纯历史数据缓存24小时，涉及当天
+的查询只缓存5分钟，容量满时按LRU淘汰。
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from inspect import signature
+
+logger = logging.getLogger(__name__)
+
+_TTL_HISTORICAL = 24 * 3600
+_TTL_TODAY = 300
+_MAX_ENTRIES = 256
+
+
+def _ttl_for(arguments) -> int:
+    """根据查询日期参数决定缓存时长：涉及当天（或未指定结束日期）的
+    结果可能随行情更新，只做短缓存"""
+    today = datetime.now().strftime("%Y%m%d")
+    trade_date = str(arguments.get("trade_date") or "")
+    end_date = str(arguments.get("end_date") or "")
+    if trade_date == today or (end_date and end_date >= today):
+        return _TTL_TODAY
+    if not trade_date and not end_date:
+        return _TTL_TODAY
+    return _TTL_HISTORICAL
+
+
+def _is_error_result(result) -> bool:
+    """识别工具的失败返回
+
+    工具有两种错误约定：dict带success/ok标志位，JSON字符串以
+    {"ok":false开头（旧式纯文本错误带❌/⚠️前缀）。
+    """
+    if isinstance(result, dict):
+        return result.get("success") is False or result.get("ok") is False
+    if isinstance(result, str):
+        return (result.startswith('{"ok":false')
+                or result.startswith("❌")
+                or result.startswith("⚠️"))
+    return False
+
+
+def tool_cache(func):
+    """按调用参数缓存工具结果的装饰器（TTL + LRU淘汰）"""
+    sig = signature(func)
+    cache: OrderedDict = OrderedDict()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = bound.arguments
+        key = tuple(sorted((name, str(value))
+                           for name, value in arguments.items()))
+
+        now = time.monotonic()
+        hit = cache.get(key)
+        if hit is not None and hit[0] > now:
+            cache.move_to_end(key)
+            logger.debug("%s 命中结果缓存", func.__name__)
+            return hit[1]
+
+        result = func(*args, **kwargs)
+        # 失败结果不入缓存：限频/网络抖动这类临时故障若按历史TTL
+        # 缓存24小时，同参数查询在此期间会一直拿到旧错误且不再重试
+        if not _is_error_result(result):
+            cache[key] = (now + _ttl_for(arguments), result)
+            if len(cache) > _MAX_ENTRIES:
+                cache.popitem(last=False)
+        return result
+
+    return wrapper
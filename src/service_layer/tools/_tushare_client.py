@@ -0,0 +1,28 @@
+"""
+Tushare客户端共享模块
+各工具共用同一个pro_api实例：token设置、配置读取和HTTP客户端构建
+只在进程内发生一次，后续工具调用直接复用连接状态
+"""
+
+import threading
+
+import tushare as ts
+
+from ..config.config_manager import get_config_manager
+
+_pro = None
+_lock = threading.Lock()
+
+
+def get_tushare_pro():
+    """获取进程内共享的Tushare Pro API实例（懒初始化，线程安全）"""
+    global _pro
+    if _pro is None:
+        with _lock:
+            if _pro is None:
+                token = get_config_manager().get_tushare_config()
+                if not token:
+                    raise Exception("Tushare API token未配置")
+                ts.set_token(token)
+                _pro = ts.pro_api()
+    return _pro
@@ -3,28 +3,72 @@
 封装Tushare的adj_factor方法，提供股票复权因子数据获取功能
 """
 
+import orjson
 import pandas as pd
-import tushare as ts
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any
 from langchain_core.tools import tool
 from datetime import datetime, timedelta
 
-from ..config.config_manager import config_manager
+from ._tushare_client import get_tushare_pro
 
 
 def _get_tushare_pro():
-    """获取Tushare Pro API实例"""
+    """获取Tushare Pro API实例（跨工具共享的进程内单例）"""
     try:
-        tushare_token = config_manager.get_tushare_config()
-        if not tushare_token:
-            raise Exception("Tushare API token未配置")
-        ts.set_token(tushare_token)
-        pro = ts.pro_api()
-        return pro
+        return get_tushare_pro()
     except Exception as e:
         raise Exception(f"Tushare Pro API初始化失败: {str(e)}")
 
 
+# 范围查询的并发拉取参数：按月分桶、并发上限4以兼顾Tushare限频
+_MAX_FETCH_WORKERS = 4
+
+
+def _month_buckets(start_date: str, end_date: str):
+    """把[start_date, end_date]按自然月切分为(开始, 结束)列表"""
+    start = datetime.strptime(start_date, "%Y%m%d")
+    end = datetime.strptime(end_date, "%Y%m%d")
+    buckets = []
+    cur = start
+    while cur <= end:
+        next_month = (cur.replace(day=1) + timedelta(days=32)).replace(day=1)
+        bucket_end = min(next_month - timedelta(days=1), end)
+        buckets.append((cur.strftime("%Y%m%d"), bucket_end.strftime("%Y%m%d")))
+        cur = next_month
+    return buckets
+
+
+def _fetch_adj_factor(pro, params: Dict[str, Any]):
+    """拉取复权因子数据
+
+    跨多个月份的范围查询切成月桶并发拉取再拼接：网络往返相互重叠，
+    墙钟时间从各请求之和降到最慢桶加并发系数；单桶/单日查询照旧直连。
+    """
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    if params.get('trade_date') or not (start_date and end_date):
+        return pro.adj_factor(**params)
+
+    buckets = _month_buckets(start_date, end_date)
+    if len(buckets) <= 1:
+        return pro.adj_factor(**params)
+
+    base = {k: v for k, v in params.items()
+            if k not in ('start_date', 'end_date')}
+    with ThreadPoolExecutor(max_workers=_MAX_FETCH_WORKERS) as pool:
+        frames = list(pool.map(
+            lambda bucket: pro.adj_factor(
+                start_date=bucket[0], end_date=bucket[1], **base),
+            buckets,
+        ))
+
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True, copy=False)
+
+
 @tool
 def get_adj_factor(
     ts_code: str = "",
@@ -77,29 +121,33 @@ def get_adj_factor(
         print(f"📅 查询参数: {params}")
         print(f"🔌 调用Tushare adj_factor接口...")
         
-        df = pro.adj_factor(**params)
+        df = _fetch_adj_factor(pro, params)
         
         if df is None or df.empty:
             return f"⚠️ 警告: 未获取到复权因子数据，请检查参数是否正确"
         
         print(f"✅ 成功获取 {len(df)} 条复权因子数据")
-        
-        # 数据预处理
-        df = df.sort_values(['ts_code', 'trade_date'], ascending=[True, True])
-        
-        # 统计分析
+
+        # 数据预处理：ts_code转为category，去重计数退化为O(1)读类目数；
+        # 不做全表排序——样本数据不要求有序，单股票路径只排自己的子集
+        if 'ts_code' in df.columns:
+            df['ts_code'] = df['ts_code'].astype('category')
+
+        # 统计分析：每列一次agg调用算齐所需统计量，替代逐项min/max/mean多趟扫描
+        date_stats = df['trade_date'].agg(['min', 'max']) if 'trade_date' in df.columns else None
+        factor_stats = df['adj_factor'].agg(['min', 'max', 'mean']) if 'adj_factor' in df.columns else None
         stats = {
             "数据条数": len(df),
             "涉及股票数": df['ts_code'].nunique() if 'ts_code' in df.columns else 0,
             "日期范围": {
-                "开始日期": df['trade_date'].min() if 'trade_date' in df.columns else None,
-                "结束日期": df['trade_date'].max() if 'trade_date' in df.columns else None
-            } if 'trade_date' in df.columns else None,
+                "开始日期": date_stats['min'],
+                "结束日期": date_stats['max']
+            } if date_stats is not None else None,
             "复权因子范围": {
-                "最小值": float(df['adj_factor'].min()) if 'adj_factor' in df.columns else None,
-                "最大值": float(df['adj_factor'].max()) if 'adj_factor' in df.columns else None,
-                "平均值": float(df['adj_factor'].mean()) if 'adj_factor' in df.columns else None
-            } if 'adj_factor' in df.columns else None
+                "最小值": factor_stats['min'],
+                "最大值": factor_stats['max'],
+                "平均值": factor_stats['mean']
+            } if factor_stats is not None else None
         }
         
         # 格式化结果
@@ -118,29 +166,34 @@ def get_adj_factor(
         # 如果是单个股票查询，提供更详细的信息
         if ts_code:
             stock_df = df[df['ts_code'] == ts_code] if 'ts_code' in df.columns else df
+            if len(stock_df) > 0 and 'trade_date' in stock_df.columns:
+                # 只对该股票的子集按日期排序，支撑"最新因子/最近数据"语义
+                stock_df = stock_df.sort_values('trade_date')
             result["stock_specific"] = {
                 "stock_code": ts_code,
                 "data_count": len(stock_df),
-                "latest_factor": float(stock_df.iloc[-1]['adj_factor']) if len(stock_df) > 0 and 'adj_factor' in stock_df.columns else None,
+                "latest_factor": stock_df.iloc[-1]['adj_factor'] if len(stock_df) > 0 and 'adj_factor' in stock_df.columns else None,
                 "recent_data": stock_df.tail(5).to_dict('records') if len(stock_df) > 0 else []
             }
         
         # 如果是单个日期查询，按复权因子排序显示异常值
         if trade_date:
             if 'adj_factor' in df.columns:
-                # 找出复权因子异常的股票
-                sorted_df = df.sort_values('adj_factor', ascending=False)
+                # 找出复权因子异常的股票：nlargest/nsmallest是O(n)部分选择，
+                # 无需对全表做O(n log n)排序
                 result["date_specific"] = {
                     "trade_date": trade_date,
                     "stock_count": len(df),
-                    "top_adj_factors": sorted_df.head(5).to_dict('records'),  # 复权因子最大的5只
-                    "bottom_adj_factors": sorted_df.tail(5).to_dict('records')  # 复权因子最小的5只
+                    "top_adj_factors": df.nlargest(5, 'adj_factor').to_dict('records'),  # 复权因子最大的5只
+                    "bottom_adj_factors": df.nsmallest(5, 'adj_factor').iloc[::-1].to_dict('records')  # 复权因子最小的5只
                 }
         
         print(f"📊 复权因子数据汇总完成")
         
-        import json
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        # orjson原生输出UTF-8并直接序列化numpy标量，省去逐值float()转换
+        return orjson.dumps(
+            result, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+        ).decode()
         
     except Exception as e:
         error_msg = f"获取复权因子失败: {str(e)}"
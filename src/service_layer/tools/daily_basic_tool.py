@@ -4,46 +4,128 @@
 用于选股分析、报表展示等
 """
 
+import re
+
+import numpy as np
+import orjson
 import pandas as pd
-import tushare as ts
+from collections import OrderedDict
 from typing import Optional, Dict, Any
 from langchain_core.tools import tool
 from datetime import datetime, timedelta
 
-from ..config.config_manager import config_manager
+from ._cache import tool_cache
+from ._tushare_client import get_tushare_pro
+
+# 默认只取后续统计/概览实际用到的字段：Tushare按字段量
+# 计费带宽和序列化，原15列里近半下游从未引用
+_DEFAULT_FIELDS = 'ts_code,trade_date,close,turnover_rate,pe,pb,total_mv,circ_mv'
+
+# 股票代码校验：单次预编译正则匹配替代长度+包含的多分支检查，
+# 同时覆盖北交所(.BJ)后缀
+_TSCODE_RE = re.compile(r'^\d{6}\.(SZ|SH|BJ)$')
+
+# 日期范围预取缓存：Agent按日循环查询时每天一次Tushare往返
+# （200~500ms量级），预取整段范围后单日查询退化为内存切片
+_RANGE_CACHE: OrderedDict = OrderedDict()
+_RANGE_CACHE_MAX = 8
+
+
+def _records(df: pd.DataFrame):
+    """DataFrame切片转记录列表
+
+    走pandas的C层to_json再由orjson解析：绕开to_dict('records')
+    逐行逐列构造Python字典的慢路径，NaN也顺带规整为null。
+    """
+    return orjson.loads(df.to_json(orient="records"))
+
+
+def _err(msg: str) -> str:
+    """错误响应统一为JSON对象
+
+    调用方检查一个ok键即可分派成败，免去对'❌ 错误'前缀
+    做字符串匹配再二次解析的分支逻辑。
+    """
+    return orjson.dumps({"ok": False, "error": msg}).decode()
+
+
+def _metric(row: Dict[str, Any], name: str) -> Optional[float]:
+    """从行字典取数值指标，缺失/NaN返回None
+
+    value == value是免函数调用的NaN自比较判空，
+    比逐字段pd.notna快一个数量级。
+    """
+    value = row.get(name)
+    return float(value) if value is not None and value == value else None
 
 
 def _get_tushare_pro():
-    """获取Tushare Pro API实例"""
+    """获取Tushare Pro API实例（跨工具共享的进程内单例）"""
     try:
-        tushare_token = config_manager.get_tushare_config()
-        if not tushare_token:
-            raise Exception("Tushare API token未配置")
-        ts.set_token(tushare_token)
-        pro = ts.pro_api()
-        return pro
+        return get_tushare_pro()
     except Exception as e:
         raise Exception(f"Tushare Pro API初始化失败: {str(e)}")
 
 
+def get_daily_basic_range(start_date: str, end_date: str,
+                          fields: str = "") -> pd.DataFrame:
+    """一次性获取整段日期范围的日指标数据并缓存
+
+    对一个月的逐日循环，把22次API调用折叠成1次；
+    后续落在范围内的单日查询由get_daily_basic直接切片命中。
+    """
+    fields = fields or _DEFAULT_FIELDS
+    key = (start_date, end_date, fields)
+    cached = _RANGE_CACHE.get(key)
+    if cached is not None:
+        _RANGE_CACHE.move_to_end(key)
+        return cached
+
+    df = _get_tushare_pro().daily_basic(
+        start_date=start_date, end_date=end_date, fields=fields)
+    if df is not None and not df.empty:
+        _RANGE_CACHE[key] = df
+        if len(_RANGE_CACHE) > _RANGE_CACHE_MAX:
+            _RANGE_CACHE.popitem(last=False)
+    return df
+
+
+def _range_cache_lookup(trade_date: str, fields: str) -> Optional[pd.DataFrame]:
+    """单日查询命中已预取的范围缓存时返回内存切片，否则None"""
+    for (lo, hi, cached_fields), cached in _RANGE_CACHE.items():
+        if cached_fields == fields and lo <= trade_date <= hi:
+            return cached[cached['trade_date'] == trade_date].copy()
+    return None
+
+
 @tool
+@tool_cache
 def get_daily_basic(
     ts_code: str = "",
     trade_date: str = "",
     start_date: str = "",
     end_date: str = "",
-    fields: str = ""
+    fields: str = "",
+    compact: bool = True,
+    include_analysis: bool = True,
+    include_overview: bool = True
 ) -> str:
     """
     获取股票每日重要基本面指标
-    
+
     Args:
         ts_code: 股票代码，如'000001.SZ'，为空则获取所有股票
         trade_date: 交易日期，格式YYYYMMDD，如'20180726'
         start_date: 开始日期，格式YYYYMMDD
-        end_date: 结束日期，格式YYYYMMDD  
+        end_date: 结束日期，格式YYYYMMDD
         fields: 指定字段，如'ts_code,trade_date,turnover_rate,volume_ratio,pe,pb'
-        
+        compact: 是否输出紧凑JSON。结果默认被Agent框架直接重新解析，
+            缩进徒增约30%字节；仅供人工查看时传False保留缩进
+        include_analysis: 是否生成单股详细分析。只要statistics时传False
+            跳过该段计算
+        include_overview: 是否生成单日市场概览（PE/市值排名）。对全市场
+            数千行的帧，概览要跑两次过滤和四次topN选择，不需要时传False
+
     Returns:
         包含日指标数据的JSON字符串
         
@@ -57,11 +139,11 @@ def get_daily_basic(
         
         # 参数验证：必须提供交易日期或日期范围
         if not trade_date and not (start_date and end_date):
-            return f"❌ 错误: 必须提供trade_date或start_date+end_date参数"
-        
+            return _err("必须提供trade_date或start_date+end_date参数")
+
         # 验证股票代码格式(如果提供)
-        if ts_code and (len(ts_code) != 9 or '.' not in ts_code):
-            return f"❌ 错误: 股票代码格式不正确，应为'000001.SZ'格式，当前输入: {ts_code}"
+        if ts_code and not _TSCODE_RE.match(ts_code):
+            return _err(f"股票代码格式不正确，应为'000001.SZ'格式，当前输入: {ts_code}")
         
         # 获取Tushare Pro实例
         pro = _get_tushare_pro()
@@ -76,57 +158,78 @@ def get_daily_basic(
             params['start_date'] = start_date
         if end_date:
             params['end_date'] = end_date
-        if fields:
-            params['fields'] = fields
-        else:
-            # 默认常用字段
-            params['fields'] = 'ts_code,trade_date,close,turnover_rate,volume_ratio,pe,pb,ps,dv_ratio,dv_ttm,total_share,float_share,free_share,total_mv,circ_mv'
-            
+        params['fields'] = fields or _DEFAULT_FIELDS
+
         print(f"📅 查询参数: {params}")
-        print(f"🔌 调用Tushare daily_basic接口...")
-        
-        df = pro.daily_basic(**params)
+
+        # 单日全市场查询优先命中范围预取缓存，省一次网络往返
+        df = None
+        if trade_date and not ts_code:
+            df = _range_cache_lookup(trade_date, params['fields'])
+
+        if df is None:
+            print(f"🔌 调用Tushare daily_basic接口...")
+            df = pro.daily_basic(**params)
         
         if df is None or df.empty:
-            return f"⚠️ 警告: 未获取到日指标数据，可能是非交易日或参数错误"
+            return _err("未获取到日指标数据，可能是非交易日或参数错误")
         
         print(f"✅ 成功获取 {len(df)} 条日指标数据")
         
-        # 数据预处理
-        if 'trade_date' in df.columns and 'ts_code' in df.columns:
-            df = df.sort_values(['trade_date', 'ts_code'], ascending=[True, True])
+        # 数据预处理：只按真正变化的键排序——单日期查询时trade_date是
+        # 常量、单股票查询时ts_code是常量，排它们纯属浪费；两键都固定
+        # 时整个排序可跳过。Tushare输出大体有序，稳定归并排序更快
+        sort_keys = [key for key, fixed in (('trade_date', trade_date),
+                                            ('ts_code', ts_code))
+                     if not fixed and key in df.columns]
+        if sort_keys:
+            df = df.sort_values(sort_keys, kind='mergesort')
         
         # 数值列处理
         numeric_cols = ['close', 'turnover_rate', 'volume_ratio', 'pe', 'pb', 'ps', 
                        'dv_ratio', 'dv_ttm', 'total_share', 'float_share', 'free_share', 
                        'total_mv', 'circ_mv']
         
-        for col in numeric_cols:
+        # Tushare通常已返回数值dtype；只有出现object列时才做一次
+        # 整块coerce，替代此前逐列13趟的pd.to_numeric
+        present = [col for col in numeric_cols if col in df.columns]
+        if present and df[present].dtypes.eq(object).any():
+            df[present] = df[present].apply(pd.to_numeric, errors='coerce')
+
+        # 代码/日期列高度重复，转category后统计量直接读categories
+        # （去重且已排序），免去nunique/min/max三趟全列扫描，
+        # 字符串列内存也显著缩小
+        for col in ('ts_code', 'trade_date'):
             if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
+                df[col] = df[col].astype('category')
+
         # 统计分析
         stats = {
             "数据条数": len(df),
-            "涉及股票数": df['ts_code'].nunique() if 'ts_code' in df.columns else 0,
+            "涉及股票数": df['ts_code'].cat.categories.size if 'ts_code' in df.columns else 0,
             "日期范围": {
-                "开始日期": df['trade_date'].min() if 'trade_date' in df.columns else None,
-                "结束日期": df['trade_date'].max() if 'trade_date' in df.columns else None
+                "开始日期": df['trade_date'].cat.categories[0],
+                "结束日期": df['trade_date'].cat.categories[-1]
             } if 'trade_date' in df.columns else None,
         }
         
-        # 添加关键指标统计
+        # 添加关键指标统计：一次融合agg算齐全部指标的统计量
+        # （自动跳过NaN），替代每指标dropna加5次独立归约
         key_metrics_stats = {}
-        for metric in ['pe', 'pb', 'turnover_rate', 'total_mv']:
-            if metric in df.columns:
-                metric_data = df[metric].dropna()
-                if len(metric_data) > 0:
+        present_metrics = [m for m in ('pe', 'pb', 'turnover_rate', 'total_mv')
+                           if m in df.columns]
+        if present_metrics:
+            desc = df[present_metrics].agg(
+                ['count', 'mean', 'median', 'min', 'max', 'std'])
+            for metric in present_metrics:
+                col = desc[metric]
+                if col['count'] > 0:
                     key_metrics_stats[metric] = {
-                        "平均值": float(metric_data.mean()),
-                        "中位数": float(metric_data.median()),
-                        "最小值": float(metric_data.min()),
-                        "最大值": float(metric_data.max()),
-                        "标准差": float(metric_data.std())
+                        "平均值": col['mean'],
+                        "中位数": col['median'],
+                        "最小值": col['min'],
+                        "最大值": col['max'],
+                        "标准差": col['std']
                     }
         
         if key_metrics_stats:
@@ -134,6 +237,7 @@ def get_daily_basic(
         
         # 格式化结果
         result = {
+            "ok": True,
             "query_params": {
                 "ts_code": ts_code or "全部股票",
                 "trade_date": trade_date or f"{start_date}至{end_date}",
@@ -141,63 +245,72 @@ def get_daily_basic(
             },
             "statistics": stats,
             "columns": df.columns.tolist(),
-            "sample_data": df.head(10).to_dict('records'),
+            "sample_data": _records(df.head(10)),
         }
         
         # 如果是单个股票查询，提供更详细的分析
-        if ts_code:
+        if include_analysis and ts_code:
             stock_df = df[df['ts_code'] == ts_code] if 'ts_code' in df.columns else df
             if len(stock_df) > 0:
-                latest_data = stock_df.iloc[-1]
+                # 整行一次性转普通dict：Series.get每次都要走标签解析，
+                # 六个字段就是六趟；dict.get是O(1)哈希查找
+                latest_row = stock_df.iloc[-1].to_dict()
                 result["stock_analysis"] = {
                     "stock_code": ts_code,
                     "data_count": len(stock_df),
                     "latest_metrics": {
-                        "交易日期": latest_data.get('trade_date', 'N/A'),
-                        "收盘价": float(latest_data.get('close', 0)) if pd.notna(latest_data.get('close')) else None,
-                        "市盈率PE": float(latest_data.get('pe', 0)) if pd.notna(latest_data.get('pe')) else None,
-                        "市净率PB": float(latest_data.get('pb', 0)) if pd.notna(latest_data.get('pb')) else None,
-                        "换手率": float(latest_data.get('turnover_rate', 0)) if pd.notna(latest_data.get('turnover_rate')) else None,
-                        "总市值": float(latest_data.get('total_mv', 0)) if pd.notna(latest_data.get('total_mv')) else None
+                        "交易日期": latest_row.get('trade_date', 'N/A'),
+                        "收盘价": _metric(latest_row, 'close'),
+                        "市盈率PE": _metric(latest_row, 'pe'),
+                        "市净率PB": _metric(latest_row, 'pb'),
+                        "换手率": _metric(latest_row, 'turnover_rate'),
+                        "总市值": _metric(latest_row, 'total_mv')
                     },
-                    "recent_data": stock_df.tail(5).to_dict('records') if len(stock_df) > 0 else []
+                    "recent_data": _records(stock_df.tail(5)) if len(stock_df) > 0 else []
                 }
         
         # 如果是单个日期查询，提供市场概览
-        if trade_date:
-            # PE排序分析
+        if include_overview and trade_date:
+            # PE排序分析：直接在numpy数组上合成掩码，notna+比较+按标签
+            # 对齐的三趟pandas扫描缩成两个融合的ufunc；isfinite还顺带
+            # 滤掉±Inf
             if 'pe' in df.columns:
-                pe_data = df[df['pe'].notna() & (df['pe'] > 0)]
+                pe_arr = df['pe'].to_numpy(dtype=np.float64)
+                pe_data = df.iloc[np.isfinite(pe_arr) & (pe_arr > 0)]
                 if len(pe_data) > 0:
-                    pe_sorted = pe_data.sort_values('pe')
+                    # nsmallest/nlargest是O(n)部分选择，免去全表排序；
+                    # 最高PE一侧反转下，保持原先升序输出
                     result["market_overview"] = {
                         "trade_date": trade_date,
                         "total_stocks": len(df),
                         "valid_pe_stocks": len(pe_data),
                         "pe_analysis": {
-                            "最低PE股票": pe_sorted.head(5)[['ts_code', 'pe', 'pb', 'total_mv']].to_dict('records'),
-                            "最高PE股票": pe_sorted.tail(5)[['ts_code', 'pe', 'pb', 'total_mv']].to_dict('records')
+                            "最低PE股票": _records(pe_data.nsmallest(5, 'pe')[['ts_code', 'pe', 'pb', 'total_mv']]),
+                            "最高PE股票": _records(pe_data.nlargest(5, 'pe').iloc[::-1][['ts_code', 'pe', 'pb', 'total_mv']])
                         }
                     }
                     
             # 市值分析
             if 'total_mv' in df.columns:
-                mv_data = df[df['total_mv'].notna()]
+                mv_arr = df['total_mv'].to_numpy(dtype=np.float64)
+                mv_data = df.iloc[np.isfinite(mv_arr)]
                 if len(mv_data) > 0:
-                    mv_sorted = mv_data.sort_values('total_mv', ascending=False)
                     if "market_overview" not in result:
                         result["market_overview"] = {"trade_date": trade_date}
                     result["market_overview"]["market_cap_analysis"] = {
-                        "最大市值股票": mv_sorted.head(5)[['ts_code', 'total_mv', 'pe', 'pb']].to_dict('records'),
-                        "最小市值股票": mv_sorted.tail(5)[['ts_code', 'total_mv', 'pe', 'pb']].to_dict('records')
+                        "最大市值股票": _records(mv_data.nlargest(5, 'total_mv')[['ts_code', 'total_mv', 'pe', 'pb']]),
+                        "最小市值股票": _records(mv_data.nsmallest(5, 'total_mv').iloc[::-1][['ts_code', 'total_mv', 'pe', 'pb']])
                     }
         
         print(f"📊 日指标数据汇总完成")
         
-        import json
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        # orjson原生输出UTF-8并直接序列化numpy标量，省去逐值float()转换
+        option = orjson.OPT_SERIALIZE_NUMPY
+        if not compact:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(result, option=option, default=str).decode()
         
     except Exception as e:
         error_msg = f"获取日指标数据失败: {str(e)}"
         print(f"❌ {error_msg}")
-        return f"❌ 错误: {error_msg}"
+        return _err(error_msg)
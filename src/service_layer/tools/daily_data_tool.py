@@ -3,12 +3,23 @@ DailyDataTool - 日K线数据获取工具
 提供股票日线行情数据获取功能
 """
 
+import re
+
 import pandas as pd
-import tushare as ts
 from typing import Dict, Optional, Any
 from langchain_core.tools import tool
 from datetime import datetime, timedelta
-from ..config.config_manager import config_manager
+from ._cache import tool_cache
+from ._tushare_client import get_tushare_pro
+
+# 日期校验走预编译正则+整数范围检查，比strptime省去完整的日历解析；
+# translate一次性剥离常见分隔符，替代链式replace的三趟扫描
+_DATE_RE = re.compile(r'^(\d{4})(\d{2})(\d{2})$')
+_SEP_TBL = str.maketrans('', '', '-/.')
+_DAYS_IN_MONTH = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+# 股票代码终检：单次预编译正则匹配替代多分支检查，覆盖北交所(.BJ)
+_TSCODE_RE = re.compile(r'^\d{6}\.(SZ|SH|BJ)$')
 
 
 class DailyDataTool:
@@ -20,15 +31,9 @@ class DailyDataTool:
         从配置文件读取Tushare API token
         """
         try:
-            # 从配置文件读取Tushare API token
-            self.token = config_manager.get_tushare_config()
-            if self.token:
-                ts.set_token(self.token)
-                self.pro = ts.pro_api()
-                print(f"✅ Tushare API 初始化成功")
-            else:
-                self.pro = None
-                print(f"⚠️  未找到Tushare API token，将使用模拟数据")
+            # 复用跨工具共享的Tushare客户端单例
+            self.pro = get_tushare_pro()
+            print(f"✅ Tushare API 初始化成功")
         except Exception as e:
             self.pro = None
             print(f"⚠️  Tushare API 初始化失败: {e}，将使用模拟数据")
@@ -57,7 +62,11 @@ class DailyDataTool:
                 ts_code += '.SZ'  # 深交所
             else:
                 raise ValueError(f"无法识别股票代码: {ts_code}")
-        
+
+        # 终检：带后缀的输入此前不校验主体格式，统一过一遍正则
+        if not _TSCODE_RE.match(ts_code):
+            raise ValueError(f"股票代码格式不正确，应为'000001.SZ'格式: {ts_code}")
+
         return ts_code
     
     def _validate_date_format(self, date_str: str) -> str:
@@ -72,20 +81,21 @@ class DailyDataTool:
         """
         if not date_str:
             return ""
-        
+
         # 移除常见分隔符
-        date_str = date_str.replace('-', '').replace('/', '').replace('.', '')
-        
-        # 验证长度
-        if len(date_str) != 8:
+        date_str = date_str.translate(_SEP_TBL)
+
+        # 验证格式
+        match = _DATE_RE.match(date_str)
+        if not match:
             raise ValueError(f"日期格式错误，应为YYYYMMDD格式: {date_str}")
-        
-        # 验证是否为有效日期
-        try:
-            datetime.strptime(date_str, '%Y%m%d')
-        except ValueError:
+
+        # 验证月/日取值范围（2月按闰年上限29放行）
+        month = int(match.group(2))
+        day = int(match.group(3))
+        if not (1 <= month <= 12) or not (1 <= day <= _DAYS_IN_MONTH[month - 1]):
             raise ValueError(f"无效日期: {date_str}")
-        
+
         return date_str
     
     def get_daily_data(self, 
@@ -189,6 +199,7 @@ daily_data_tool = DailyDataTool()
 
 
 @tool
+@tool_cache
 def get_daily_stock_data(ts_code: str, start_date: str = None, end_date: str = None) -> Dict[str, Any]:
     """
     获取股票日线行情数据的工具函数
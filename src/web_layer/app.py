@@ -4,17 +4,55 @@ Flask应用入口文件
 """
 
 from flask import Flask, render_template
-from flask_socketio import SocketIO
+from flask.json.provider import JSONProvider
+from flask_socketio import SocketIO, join_room
+import orjson
 import os
 
+
+class OrjsonProvider(JSONProvider):
+    """基于orjson的JSON Provider
+
+    jsonify返回的Agent响应dict经orjson序列化比stdlib json快数倍，
+    且直接输出UTF-8字节，省去二次编码。
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 def create_app():
     """创建Flask应用实例"""
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'your-secret-key-here'  # 生产环境需要更改
+    app.json = OrjsonProvider(app)
     
-    # 初始化SocketIO
-    socketio = SocketIO(app, cors_allowed_origins="*")
-    
+    # 初始化SocketIO：优先gevent异步模式，长耗时的Tushare/Agent调用
+    # 不会阻塞无关的websocket心跳；生产环境建议以
+    #   gunicorn -k geventwebsocket.gunicorn.workers.GeventWebSocketWorker \
+    #            -w 4 app:app
+    # 方式启动。gevent未安装时回退默认线程模式（开发环境够用）
+    try:
+        socketio = SocketIO(app, cors_allowed_origins="*", async_mode='gevent')
+    except ValueError:
+        socketio = SocketIO(app, cors_allowed_origins="*")
+
+    # 路由层经此引用socketio做后台任务派发和消息推送；
+    # start_background_task按async_mode选择线程或greenlet，
+    # 与上面的gevent模式兼容
+    app.extensions['socketio'] = socketio
+
+    @socketio.on('join_conversation')
+    def on_join_conversation(data):
+        """前端进入对话后加入对应房间，以便定向接收AI回复推送"""
+        conversation_id = (data or {}).get('conversation_id')
+        if conversation_id:
+            join_room(conversation_id)
+
+
     # 注册路由
     from routes.main_routes import main_bp
     from routes.api_routes import api_bp
@@ -35,4 +73,6 @@ def index():
 if __name__ == '__main__':
     print("🚀 Multi-Agent Quant Trader Web Layer 启动中...")
     print("📱 访问地址: http://localhost:5000")
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000)
+    # Werkzeug调试服务器单线程串行处理请求，仅开发环境启用
+    debug = os.getenv('FLASK_ENV') == 'development'
+    socketio.run(app, debug=debug, host='0.0.0.0', port=5000)
@@ -3,7 +3,9 @@ API路由
 负责处理前后端数据交互的API接口
 """
 
-from flask import Blueprint, request, jsonify
+from collections import defaultdict
+
+from flask import Blueprint, current_app, request, jsonify
 import uuid
 from datetime import datetime
 
@@ -12,6 +14,9 @@ api_bp = Blueprint('api', __name__)
 # 临时存储（后续会替换为数据库）
 conversations = {}
 messages = {}
+# 对话 -> 消息ID列表的索引：读取/删除消息时按索引直取，
+# 避免随消息总量线性增长的全表扫描；追加即有序，无需再按时间排序
+messages_by_conv = defaultdict(list)
 
 @api_bp.route('/conversations/create', methods=['POST'])
 def create_conversation():
@@ -55,14 +60,12 @@ def get_conversation_messages(conversation_id):
         if conversation_id not in conversations:
             return jsonify({'error': '对话不存在'}), 404
         
+        # 索引中的消息ID按插入顺序排列，即为时间顺序
         conversation_messages = [
-            msg for msg in messages.values() 
-            if msg['conversation_id'] == conversation_id
+            messages[message_id]
+            for message_id in messages_by_conv.get(conversation_id, [])
         ]
-        
-        # 按时间顺序排列
-        conversation_messages.sort(key=lambda x: x['timestamp'])
-        
+
         return jsonify({
             'conversation_id': conversation_id,
             'messages': conversation_messages
@@ -81,13 +84,9 @@ def delete_conversation(conversation_id):
         # 删除对话
         del conversations[conversation_id]
         
-        # 删除相关消息
-        message_keys_to_delete = [
-            key for key, msg in messages.items() 
-            if msg['conversation_id'] == conversation_id
-        ]
-        for key in message_keys_to_delete:
-            del messages[key]
+        # 删除相关消息（按索引直取，免全表扫描）
+        for message_id in messages_by_conv.pop(conversation_id, []):
+            messages.pop(message_id, None)
         
         return jsonify({'success': True, 'message': '对话已删除'})
     
@@ -122,62 +121,92 @@ def send_message():
         }
         
         messages[user_message_id] = user_message
-        
-        # 调用Service层处理消息
+        messages_by_conv[conversation_id].append(user_message_id)
+
+        # 调用Service层处理消息：Agent处理耗时在秒级，交给
+        # socketio.start_background_task后台执行（按async_mode自动选择
+        # 线程或greenlet，emit在两种模式下都安全），立即返回202；
+        # 处理结果经SocketIO推送到对话房间
         try:
             import sys
             from pathlib import Path
             project_root = Path(__file__).parent.parent.parent.parent
             sys.path.insert(0, str(project_root))
-            
+
             from src.service_layer.api.service import sync_process_user_message
-            
-            # 调用Service层
-            service_result = sync_process_user_message(
-                user_input=message_content,
-                conversation_id=conversation_id
-            )
-            
-            if service_result["success"]:
-                # 创建AI回复消息
-                ai_message_id = str(uuid.uuid4())
-                ai_response = service_result["response"]
-                ai_message = {
-                    'message_id': ai_message_id,
-                    'conversation_id': conversation_id,
-                    'role': 'assistant',
-                    'content': ai_response["content"],
-                    'timestamp': ai_response["timestamp"],
-                    'agent': ai_response.get("agent", "handler_agent"),
-                    'intent': ai_response.get("intent", "unknown")
-                }
-                
-                messages[ai_message_id] = ai_message
-                
-                # 更新对话信息
-                conversations[conversation_id]['message_count'] += 2  # 用户消息+AI回复
-                conversations[conversation_id]['last_message_time'] = ai_message['timestamp']
-                
-                return jsonify({
-                    'success': True,
-                    'user_message_id': user_message_id,
-                    'ai_message_id': ai_message_id,
-                    'conversation_id': conversation_id,
-                    'ai_response': ai_message,
-                    'agents_used': service_result.get("agents_used", ["handler_agent"]),
-                    'processing_status': service_result.get("status", "completed")
-                })
-            else:
-                # Service层处理失败
-                return jsonify({
-                    'success': False,
-                    'error': service_result.get("error", "Service层处理失败"),
-                    'user_message_id': user_message_id,
-                    'conversation_id': conversation_id
-                })
-                
+
+            socketio = current_app.extensions['socketio']
+
+            def _process_and_push():
+                """后台处理消息，完成后写入消息存储并推送给前端"""
+                try:
+                    service_result = sync_process_user_message(
+                        user_input=message_content,
+                        conversation_id=conversation_id
+                    )
+                except Exception as service_error:
+                    print(f"❌ Service层调用失败: {service_error}")
+                    socketio.emit('ai_response', {
+                        'success': False,
+                        'error': f"AI服务暂时不可用: {str(service_error)}",
+                        'user_message_id': user_message_id,
+                        'conversation_id': conversation_id
+                    }, room=conversation_id)
+                    return
+
+                if service_result["success"]:
+                    # 创建AI回复消息
+                    ai_message_id = str(uuid.uuid4())
+                    ai_response = service_result["response"]
+                    ai_message = {
+                        'message_id': ai_message_id,
+                        'conversation_id': conversation_id,
+                        'role': 'assistant',
+                        'content': ai_response.content,
+                        'timestamp': ai_response.timestamp,
+                        'agent': getattr(ai_response, "agent", "handler_agent"),
+                        'intent': getattr(ai_response, "intent", "unknown")
+                    }
+
+                    # 对话可能在后台处理期间被删除：此时整条回复直接丢弃，
+                    # 否则messages里会留下索引覆盖不到、永远无法回收的孤儿
+                    if conversation_id in conversations:
+                        messages[ai_message_id] = ai_message
+                        messages_by_conv[conversation_id].append(ai_message_id)
+
+                        # 更新对话信息
+                        conversations[conversation_id]['message_count'] += 2  # 用户消息+AI回复
+                        conversations[conversation_id]['last_message_time'] = ai_message['timestamp']
+
+                    socketio.emit('ai_response', {
+                        'success': True,
+                        'user_message_id': user_message_id,
+                        'ai_message_id': ai_message_id,
+                        'conversation_id': conversation_id,
+                        'ai_response': ai_message,
+                        'agents_used': service_result.get("agents_used", ["handler_agent"]),
+                        'processing_status': service_result.get("status", "completed")
+                    }, room=conversation_id)
+                else:
+                    # Service层处理失败
+                    socketio.emit('ai_response', {
+                        'success': False,
+                        'error': service_result.get("error", "Service层处理失败"),
+                        'user_message_id': user_message_id,
+                        'conversation_id': conversation_id
+                    }, room=conversation_id)
+
+            socketio.start_background_task(_process_and_push)
+
+            return jsonify({
+                'success': True,
+                'user_message_id': user_message_id,
+                'conversation_id': conversation_id,
+                'processing_status': 'processing'
+            }), 202
+
         except Exception as service_error:
-            # Service层调用异常，返回用户消息但标记处理失败
+            # 提交后台任务异常，返回用户消息但标记处理失败
             print(f"❌ Service层调用失败: {service_error}")
             return jsonify({
                 'success': False,
@@ -185,7 +214,7 @@ def send_message():
                 'user_message_id': user_message_id,
                 'conversation_id': conversation_id
             })
-    
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -83,6 +83,11 @@ class QuantTraderApp {
             socket.on('connect', () => {
                 console.log('WebSocket连接成功');
                 this.updateConnectionStatus(true);
+                // 断线重连后服务端房间membership已丢失，重新加入当前
+                // 对话房间，否则处理中的ai_response推送无法送达
+                if (currentConversationId) {
+                    socket.emit('join_conversation', { conversation_id: currentConversationId });
+                }
             });
 
             socket.on('disconnect', () => {
@@ -98,6 +103,10 @@ class QuantTraderApp {
                 this.displayMessage(data);
             });
 
+            socket.on('ai_response', (data) => {
+                this.handleAiResponse(data);
+            });
+
         } catch (error) {
             console.error('WebSocket初始化失败:', error);
         }
@@ -229,7 +238,12 @@ class QuantTraderApp {
     async loadConversation(conversationId) {
         try {
             currentConversationId = conversationId;
-            
+
+            // 加入对话房间，接收后台处理完成后的AI回复推送
+            if (socket && socket.connected) {
+                socket.emit('join_conversation', { conversation_id: conversationId });
+            }
+
             // 更新活动状态
             document.querySelectorAll('.conversation-item').forEach(item => {
                 item.classList.remove('active');
@@ -289,31 +303,34 @@ class QuantTraderApp {
             });
 
             const data = await response.json();
-            
-            // 移除思考中状态
-            this.removeThinkingMessage(thinkingMessageId);
-            
-            // 重新启用输入
-            this.enableInput();
-            
-            if (data.success && data.ai_response) {
-                // 显示真实的AI回复
-                this.displayMessage({
-                    role: 'assistant',
-                    content: data.ai_response.content,
-                    timestamp: data.ai_response.timestamp,
-                    agent: data.ai_response.agent,
-                    intent: data.ai_response.intent
-                });
-            } else if (data.error) {
-                // 显示错误信息
-                this.showError(data.error);
-                this.displayMessage({
-                    role: 'assistant',
-                    content: '抱歉，处理您的消息时遇到了问题：' + data.error,
-                    timestamp: new Date().toISOString(),
-                    is_error: true
-                });
+
+            if (data.success) {
+                // 服务端返回202后台处理中，保留思考状态，
+                // AI回复经'ai_response'推送到达后再展示
+                this.pendingThinkingId = thinkingMessageId;
+                // 兜底超时：推送丢失（连接中断等）时恢复输入，
+                // 避免界面永久停在思考态
+                this.responseTimeout = setTimeout(() => {
+                    if (this.pendingThinkingId) {
+                        this.removeThinkingMessage(this.pendingThinkingId);
+                        this.pendingThinkingId = null;
+                        this.enableInput();
+                        this.showError('等待AI回复超时，请重试');
+                    }
+                }, 120000);
+            } else {
+                // 提交失败，立即恢复输入并提示
+                this.removeThinkingMessage(thinkingMessageId);
+                this.enableInput();
+                if (data.error) {
+                    this.showError(data.error);
+                    this.displayMessage({
+                        role: 'assistant',
+                        content: '抱歉，处理您的消息时遇到了问题：' + data.error,
+                        timestamp: new Date().toISOString(),
+                        is_error: true
+                    });
+                }
             }
 
         } catch (error) {
@@ -329,6 +346,39 @@ class QuantTraderApp {
         }
     }
 
+    // 处理后台推送的AI回复
+    handleAiResponse(data) {
+        if (data.conversation_id !== currentConversationId) return;
+
+        if (this.responseTimeout) {
+            clearTimeout(this.responseTimeout);
+            this.responseTimeout = null;
+        }
+        if (this.pendingThinkingId) {
+            this.removeThinkingMessage(this.pendingThinkingId);
+            this.pendingThinkingId = null;
+        }
+        this.enableInput();
+
+        if (data.success && data.ai_response) {
+            this.displayMessage({
+                role: 'assistant',
+                content: data.ai_response.content,
+                timestamp: data.ai_response.timestamp,
+                agent: data.ai_response.agent,
+                intent: data.ai_response.intent
+            });
+        } else if (data.error) {
+            this.showError(data.error);
+            this.displayMessage({
+                role: 'assistant',
+                content: '抱歉，处理您的消息时遇到了问题：' + data.error,
+                timestamp: new Date().toISOString(),
+                is_error: true
+            });
+        }
+    }
+
     // 显示消息
     displayMessage(message, animate = true) {
         if (!elements.chatHistory) return;